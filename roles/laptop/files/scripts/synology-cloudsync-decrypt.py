@@ -4,23 +4,84 @@
 # /// script
 # requires-python = ">=3.14"
 # dependencies = [
+#     "cryptography>=46.0.0",
 #     "pycryptodome>=3.23.0",
 #     "lz4>=4.4.5",
 # ]
 # ///
 
 import base64
+import binascii
 import hashlib
-import io
-from collections import OrderedDict
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import traceback
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import BinaryIO
+from typing import TYPE_CHECKING
 
 import lz4.frame
-from Crypto.Cipher import AES
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+    from typing import IO
+
+try:
+    # OpenSSL's AES-NI CBC decrypt is pipelined and noticeably faster
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+    def aes_cbc_decrypt(key: bytes, iv: bytes, ciphertext: bytes) -> bytes:
+        """Decrypt AES-CBC ciphertext, leaving any padding in place."""
+        decryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+        return decryptor.update(ciphertext) + decryptor.finalize()
+
+    def aes_cbc_decryptor(
+        key: bytes,
+        iv: bytes,
+    ) -> Callable[[memoryview], bytearray]:
+        """Return a function decrypting successive whole blocks of a CBC stream."""
+        update_into = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor().update_into
+
+        def decrypt(ciphertext: memoryview) -> bytearray:
+            # update_into needs room for one extra block minus a byte
+            plaintext = bytearray(len(ciphertext) + AES_BLOCK_SIZE - 1)
+            del plaintext[update_into(ciphertext, plaintext) :]
+            return plaintext
+
+        return decrypt
+
+except ImportError:
+    from Crypto.Cipher import AES
+
+    def aes_cbc_decrypt(key: bytes, iv: bytes, ciphertext: bytes) -> bytes:
+        """Decrypt AES-CBC ciphertext, leaving any padding in place."""
+        return AES.new(key, AES.MODE_CBC, iv).decrypt(ciphertext)
+
+    def aes_cbc_decryptor(
+        key: bytes,
+        iv: bytes,
+    ) -> Callable[[memoryview], bytearray]:
+        """Return a function decrypting successive whole blocks of a CBC stream."""
+        cipher = AES.new(key, AES.MODE_CBC, iv)
+
+        def decrypt(ciphertext: memoryview) -> bytearray:
+            plaintext = bytearray(len(ciphertext))
+            cipher.decrypt(ciphertext, output=plaintext)
+            return plaintext
+
+        return decrypt
+
 
 # CloudSync file format constants
 MAGIC = b"__CLOUDSYNC_ENC__"
+# Magic followed by a 32-character MD5 hex digest
+HEADER_SIZE = len(MAGIC) + 32
+# Session keys are stored hex-encoded
+HEX_DIGITS = b"0123456789abcdefABCDEF"
 
 # TLV (Type-Length-Value) header bytes
 TLV_DICT_START = 0x42
@@ -28,54 +89,108 @@ TLV_DICT_END = 0x40
 TLV_STRING = 0x10
 TLV_BYTES = 0x11
 TLV_INT = 0x01
+# Big-endian length prefix of TLV strings and byte strings
+TLV_LENGTH = struct.Struct(">H")
 
 # AES constants
 AES_BLOCK_SIZE = 16
+# Expected PKCS7 padding bytes, indexed by the last byte of the data; lengths
+# that are not valid map to None so they never match
+PKCS7_PADDING = tuple(
+    bytes((n,)) * n if 1 <= n <= AES_BLOCK_SIZE else None for n in range(256)
+)
+
+# Decrypting in the background only pays off past a handful of chunks
+BACKGROUND_DECRYPT_MIN_CHUNKS = 8
+# Decrypted chunks queued on the background thread before the output catches up
+CHUNKS_IN_FLIGHT = 8
+
+# Default for metadata lookups, distinct from a stored None
+_MISSING = object()
 
 # CLI constants
 EXPECTED_ARGC = 4
 
-type TLVObject = None | OrderedDict[str | bytes | int, "TLVObject"] | str | bytes | int
+type TLVObject = (
+    None | dict[str | memoryview | int, "TLVObject"] | str | memoryview | int
+)
 
 
-def read_object(f: BinaryIO) -> TLVObject:
-    """Read a TLV-encoded object from the file stream."""
-    s = f.read(1)
-    if len(s) == 0:
-        return None
-    header_byte = s[0]
+def read_object(buf: memoryview, offset: int) -> tuple[TLVObject, int]:
+    """Read a TLV-encoded object from the buffer at the given offset.
 
-    if header_byte == TLV_DICT_START:
-        return read_dict(f)
-    if header_byte == TLV_DICT_END:
-        return None
-    if header_byte == TLV_STRING:
-        length = int.from_bytes(f.read(2), "big")
-        return f.read(length).decode("utf-8")
-    if header_byte == TLV_BYTES:
-        length = int.from_bytes(f.read(2), "big")
-        return f.read(length)
-    if header_byte == TLV_INT:
-        length = f.read(1)[0]
-        return int.from_bytes(f.read(length), "big")
-    msg = f"Unknown type byte: 0x{header_byte:02X}"
-    raise ValueError(msg)
-
-
-def read_dict(f: BinaryIO) -> OrderedDict[str | bytes | int, TLVObject]:
-    """Read a dictionary from the file stream."""
-    result: OrderedDict[str | bytes | int, TLVObject] = OrderedDict()
+    Returns the object and the offset just past it.
+    """
+    if offset >= len(buf):
+        return None, offset
+    header_byte = buf[offset]
+
+    reader = TLV_READERS.get(header_byte)
+    if reader is None:
+        msg = f"Unknown type byte: 0x{header_byte:02X}"
+        raise ValueError(msg)
+    return reader(buf, offset + 1)
+
+
+def read_dict(
+    buf: memoryview,
+    offset: int,
+) -> tuple[dict[str | memoryview | int, TLVObject], int]:
+    """Read a dictionary from the buffer at the given offset."""
+    result: dict[str | memoryview | int, TLVObject] = {}
     while True:
-        key = read_object(f)
+        key, offset = read_object(buf, offset)
         if key is None:
             break
         # Keys cannot be dicts or None in our protocol
-        if isinstance(key, OrderedDict):
+        if isinstance(key, dict):
             msg = "Dictionary keys cannot be dictionaries"
             raise TypeError(msg)
-        value = read_object(f)
+        value, offset = read_object(buf, offset)
         result[key] = value
-    return result
+    return result, offset
+
+
+def _read_dict_end(_buf: memoryview, offset: int) -> tuple[None, int]:
+    """Read the end-of-dictionary marker."""
+    return None, offset
+
+
+def _read_string(buf: memoryview, offset: int) -> tuple[str, int]:
+    """Read a length-prefixed UTF-8 string from the buffer."""
+    (length,) = TLV_LENGTH.unpack_from(buf, offset)
+    start = offset + TLV_LENGTH.size
+    end = start + length
+    return str(buf[start:end], "utf-8"), end
+
+
+def _read_bytes(buf: memoryview, offset: int) -> tuple[memoryview, int]:
+    """Read a length-prefixed byte string from the buffer.
+
+    The value is a zero-copy view into the buffer; callers copy out only the
+    fields they actually need.
+    """
+    (length,) = TLV_LENGTH.unpack_from(buf, offset)
+    start = offset + TLV_LENGTH.size
+    end = start + length
+    return buf[start:end], end
+
+
+def _read_int(buf: memoryview, offset: int) -> tuple[int, int]:
+    """Read a length-prefixed big-endian integer from the buffer."""
+    start = offset + 1
+    end = start + buf[offset]
+    return int.from_bytes(buf[start:end], "big"), end
+
+
+# Reader for each TLV header byte
+TLV_READERS: dict[int, Callable[[memoryview, int], tuple[TLVObject, int]]] = {
+    TLV_DICT_START: read_dict,
+    TLV_DICT_END: _read_dict_end,
+    TLV_STRING: _read_string,
+    TLV_BYTES: _read_bytes,
+    TLV_INT: _read_int,
+}
 
 
 def openssl_kdf(
@@ -91,46 +206,89 @@ def openssl_kdf(
     count = 1 if salt == b"" else 1000
     result = b""
     prev = b""
+    # Bind the constructor locally; the inner loop runs up to 1000 times per block
+    md5 = hashlib.md5
 
     while len(result) < key_size + iv_size:
         temp = prev + password + salt
         for _ in range(count):
-            temp = hashlib.md5(temp, usedforsecurity=False).digest()
+            temp = md5(temp, usedforsecurity=False).digest()
         prev = temp
         result += temp
 
     return result[:key_size], result[key_size : key_size + iv_size]
 
 
-def strip_pkcs7_padding(data: bytes) -> bytes:
-    """Remove PKCS7 padding from decrypted data."""
+def _pkcs7_padding_length(data: bytes | bytearray) -> int:
+    """Validate PKCS7 padding of block-aligned data and return its length."""
     if len(data) == 0:
         msg = "Empty data"
         raise ValueError(msg)
-    if len(data) % AES_BLOCK_SIZE != 0:
-        msg = "Data not 16-byte aligned"
-        raise ValueError(msg)
 
+    # Checks the length and all padding bytes with a single slice comparison
     pad_len = data[-1]
-    if pad_len == 0 or pad_len > AES_BLOCK_SIZE:
-        msg = f"Invalid padding length: {pad_len}"
+    if data[-pad_len:] != PKCS7_PADDING[pad_len]:
+        msg = f"Invalid PKCS7 padding (length {pad_len})"
         raise ValueError(msg)
+    return pad_len
 
-    # Verify all padding bytes
-    for i in range(1, pad_len + 1):
-        if data[-i] != pad_len:
-            msg = "Invalid PKCS7 padding"
-            raise ValueError(msg)
 
-    return data[:-pad_len]
+def strip_pkcs7_padding(data: bytes) -> bytes:
+    """Remove PKCS7 padding from decrypted data."""
+    if len(data) % AES_BLOCK_SIZE != 0:
+        msg = "Data not 16-byte aligned"
+        raise ValueError(msg)
+    return data[: -_pkcs7_padding_length(data)]
+
+
+def _strip_pkcs7_padding_in_place(data: bytearray) -> bytearray:
+    """Remove PKCS7 padding from data already known to be block-aligned."""
+    del data[-_pkcs7_padding_length(data) :]
+    return data
 
 
 def decrypt_with_password(ciphertext: bytes, password: bytes, salt: bytes) -> bytes:
     """Decrypt data using password and salt with OpenSSL KDF."""
     key, iv = openssl_kdf(password, salt)
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    plaintext = cipher.decrypt(ciphertext)
-    return strip_pkcs7_padding(plaintext)
+    return strip_pkcs7_padding(aes_cbc_decrypt(key, iv, ciphertext))
+
+
+class _ChunkDecryptor:
+    """Decrypt CloudSync data chunks through a single AES context.
+
+    Each chunk is a separate CBC message starting from the same IV. Feeding
+    them through one context chains a chunk's first block to the previous
+    chunk's last ciphertext block instead, so that block is corrected by
+    XOR-ing in the difference. This avoids a new key schedule per chunk.
+
+    Chunks are decrypted into a preallocated buffer and the first block is
+    patched in place, so each chunk's plaintext is written exactly once.
+    """
+
+    __slots__ = ("_chain", "_decrypt", "_iv")
+
+    def __init__(self, key: bytes, iv: bytes) -> None:
+        self._decrypt = aes_cbc_decryptor(key, iv)
+        self._iv = int.from_bytes(iv)
+        # Chaining value the context will apply to the next block
+        self._chain = self._iv
+
+    def decrypt(self, chunk: memoryview) -> bytearray:
+        """Decrypt one chunk, leaving any padding in place."""
+        if len(chunk) == 0:
+            return bytearray()
+        # The context would hold back a partial block and desync the chain
+        if len(chunk) % AES_BLOCK_SIZE != 0:
+            msg = "Data not 16-byte aligned"
+            raise ValueError(msg)
+
+        plaintext = self._decrypt(chunk)
+        if self._chain != self._iv:
+            first_block = int.from_bytes(plaintext[:AES_BLOCK_SIZE])
+            first_block ^= self._chain ^ self._iv
+            plaintext[:AES_BLOCK_SIZE] = first_block.to_bytes(AES_BLOCK_SIZE)
+        self._chain = int.from_bytes(chunk[-AES_BLOCK_SIZE:])
+        return plaintext
 
 
 class _ParsedMetadata:
@@ -143,44 +301,46 @@ class _ParsedMetadata:
         self.salt: bytes | None = None
         self.compress: int = 0
         self.file_md5_hash: str | None = None
-        self.encrypted_chunks: list[bytes] = []
+        # Views into the mapped file, so ciphertext is never copied
+        self.encrypted_chunks: list[memoryview] = []
 
 
-def _extract_salt(obj: OrderedDict[str | bytes | int, TLVObject]) -> bytes:
+def _extract_salt(salt_value: object) -> bytes:
     """Extract and validate salt from metadata object."""
-    salt_value = obj.get("salt")
     if isinstance(salt_value, str):
         return salt_value.encode("latin-1")
-    if isinstance(salt_value, bytes):
-        return salt_value
+    if isinstance(salt_value, memoryview):
+        return bytes(salt_value)
     msg = "salt must be str or bytes"
     raise TypeError(msg)
 
 
 def _process_metadata_object(
-    obj: OrderedDict[str | bytes | int, TLVObject],
+    obj: dict[str | memoryview | int, TLVObject],
     metadata: _ParsedMetadata,
 ) -> None:
     """Process a metadata object and update the metadata container."""
-    if "enc_key1" in obj:
-        enc_key1_value = obj.get("enc_key1")
+    # One lookup per field; _MISSING tells absent keys apart from None values
+    enc_key1_value = obj.get("enc_key1", _MISSING)
+    if enc_key1_value is not _MISSING:
         if not isinstance(enc_key1_value, str):
             msg = "enc_key1 must be a string"
             raise TypeError(msg)
         metadata.enc_key1 = enc_key1_value
 
-    if "salt" in obj:
-        metadata.salt = _extract_salt(obj)
+    salt_value = obj.get("salt", _MISSING)
+    if salt_value is not _MISSING:
+        metadata.salt = _extract_salt(salt_value)
 
-    if "compress" in obj:
-        compress_value = obj.get("compress", 0)
+    compress_value = obj.get("compress", _MISSING)
+    if compress_value is not _MISSING:
         if not isinstance(compress_value, int):
             msg = "compress must be an integer"
             raise TypeError(msg)
         metadata.compress = compress_value
 
-    if "file_md5" in obj:
-        file_md5_value = obj.get("file_md5")
+    file_md5_value = obj.get("file_md5", _MISSING)
+    if file_md5_value is not _MISSING:
         if not isinstance(file_md5_value, str):
             msg = "file_md5 must be a string"
             raise TypeError(msg)
@@ -188,24 +348,25 @@ def _process_metadata_object(
 
 
 def _process_data_object(
-    obj: OrderedDict[str | bytes | int, TLVObject],
+    obj: dict[str | memoryview | int, TLVObject],
     metadata: _ParsedMetadata,
 ) -> None:
     """Process a data object and append chunk to metadata container."""
     chunk = obj.get("data")
     if chunk:
-        if not isinstance(chunk, bytes):
+        if not isinstance(chunk, memoryview):
             msg = "data chunk must be bytes"
             raise TypeError(msg)
         metadata.encrypted_chunks.append(chunk)
 
 
-def _parse_cloudsync_stream(stream: io.BytesIO) -> _ParsedMetadata:
+def _parse_cloudsync_stream(buf: memoryview) -> _ParsedMetadata:
     """Parse CloudSync data stream and extract metadata and encrypted chunks."""
     metadata = _ParsedMetadata()
+    offset = 0
 
     while True:
-        obj = read_object(stream)
+        obj, offset = read_object(buf, offset)
         if obj is None:
             break
 
@@ -225,44 +386,147 @@ def _decrypt_session_key(enc_key1: str, password: str, salt: bytes) -> bytes:
     session_key = decrypt_with_password(enc_key1_bytes, password.encode(), salt)
 
     # The session key is a hex string, convert to bytes
-    if all(c in b"0123456789abcdefABCDEF" for c in session_key):
-        session_key = bytes.fromhex(session_key.decode("ascii"))
+    if not session_key.translate(None, HEX_DIGITS):
+        session_key = binascii.unhexlify(session_key)
 
     return session_key
 
 
-def _decrypt_chunks(encrypted_chunks: list[bytes], session_key: bytes) -> bytes:
-    """Decrypt all data chunks with the session key."""
-    decrypted_data = b""
-    for chunk in encrypted_chunks:
-        key, iv = openssl_kdf(session_key, b"")
-        cipher = AES.new(key, AES.MODE_CBC, iv)
-        decrypted_chunk = strip_pkcs7_padding(cipher.decrypt(chunk))
-        decrypted_data += decrypted_chunk
-    return decrypted_data
+def _decrypt_chunks(
+    encrypted_chunks: list[memoryview],
+    session_key: bytes,
+) -> Iterator[bytearray]:
+    """Decrypt data chunks with the session key, yielding each in turn.
 
+    Every chunk is an independently padded CBC message encrypted with the same
+    key and IV, so the key is derived once and shared by all chunks. With more
+    than one CPU and enough chunks, decryption runs on a background thread (the
+    AES backends release the GIL) so it overlaps with hashing and writing the
+    output, with a bounded number of chunks in flight.
+    """
+    key, iv = openssl_kdf(session_key, b"")
+    decryptor = _ChunkDecryptor(key, iv)
+
+    def decrypt(chunk: memoryview) -> bytearray:
+        return _strip_pkcs7_padding_in_place(decryptor.decrypt(chunk))
+
+    single_cpu = (os.process_cpu_count() or 1) == 1
+    if single_cpu or len(encrypted_chunks) < BACKGROUND_DECRYPT_MIN_CHUNKS:
+        yield from map(decrypt, encrypted_chunks)
+        return
+
+    # A single worker keeps the shared AES context's chunks in order
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending: deque[Future[bytearray]] = deque()
+        try:
+            for chunk in encrypted_chunks:
+                pending.append(executor.submit(decrypt, chunk))
+                if len(pending) >= CHUNKS_IN_FLIGHT:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        except BaseException:
+            # Don't decrypt the rest of the queue once a chunk or the consumer fails
+            executor.shutdown(cancel_futures=True)
+            raise
+
+
+def _decompress_chunks(chunks: Iterable[bytes | bytearray]) -> Iterator[bytes]:
+    """Decompress an LZ4 frame split across chunks, yielding output as it arrives."""
+    decompressor = lz4.frame.LZ4FrameDecompressor()
+    for chunk in chunks:
+        yield decompressor.decompress(chunk)
+    if not decompressor.eof:
+        msg = "Truncated LZ4 frame"
+        raise ValueError(msg)
+
+
+def _verify_md5(actual_hash: str, expected_hash: str) -> None:
+    """Verify MD5 hash of decrypted data."""
+    if actual_hash != expected_hash:
+        msg = f"MD5 mismatch: expected {expected_hash}, got {actual_hash}"
+        raise ValueError(msg)
 
-def _verify_md5(data: bytes, expected_hash: str | None) -> None:
-    """Verify MD5 hash of decrypted data if hash is provided."""
+
+def _write_verified(
+    chunks: Iterable[bytes | bytearray],
+    f: IO[bytes],
+    expected_hash: str | None,
+) -> None:
+    """Write chunks to an open file, hashing them on the way, then verify MD5."""
+    # Separate loops so no MD5 is computed when there is no hash to check
     if expected_hash:
-        actual_md5 = hashlib.md5(data, usedforsecurity=False).hexdigest()
-        if actual_md5 != expected_hash:
-            msg = f"MD5 mismatch: expected {expected_hash}, got {actual_md5}"
-            raise ValueError(msg)
+        md5 = hashlib.md5(usedforsecurity=False)
+        for chunk in chunks:
+            md5.update(chunk)
+            f.write(chunk)
+        _verify_md5(md5.hexdigest(), expected_hash)
+    else:
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def _open_staging_file(output: Path) -> IO[bytes] | None:
+    """Open a uniquely named temporary file beside the output, if possible."""
+    if output.exists() and not output.is_file():
+        # Devices and FIFOs cannot be staged
+        return None
+    try:
+        return tempfile.NamedTemporaryFile(
+            dir=output.parent,
+            prefix=f".{output.name}.",
+            delete=False,
+        )
+    except OSError:
+        # The output's directory may not be writable even if the output is
+        return None
 
 
-def decrypt_cloudsync(encrypted_path: str, password: str, output_path: str) -> None:
-    """Decrypt a Synology CloudSync encrypted file."""
-    data = Path(encrypted_path).read_bytes()
+def _write_chunks(
+    chunks: Iterable[bytes | bytearray],
+    output_path: str,
+    expected_hash: str | None,
+) -> None:
+    """Write chunks to the output file, hashing them on the way.
 
-    # Verify magic header
-    if not data.startswith(MAGIC):
-        msg = "Not a CloudSync encrypted file"
+    Output is staged in a temporary file beside it and only copied into an
+    existing file, or renamed into place as a new one, once the MD5 hash has
+    been verified. Outputs that cannot be staged, such as devices, FIFOs or
+    files in read-only directories, are written to directly.
+    """
+    # Resolve symlinks so the link target is written, not the link replaced
+    output = Path(output_path).resolve()
+    staging = _open_staging_file(output)
+    if staging is None:
+        with output.open("wb") as f:
+            _write_verified(chunks, f, expected_hash)
+        return
+
+    partial = Path(staging.name)
+    try:
+        with staging:
+            _write_verified(chunks, staging, expected_hash)
+        if output.exists():
+            # Copy in place to keep the inode, owner, mode, links and xattrs
+            shutil.copyfile(partial, output)
+        else:
+            # Temporary files are private; give it the mode a new file would get
+            umask = os.umask(0)
+            os.umask(umask)
+            partial.chmod(0o666 & ~umask)
+            partial.replace(output)
+    finally:
+        partial.unlink(missing_ok=True)
+
+
+def _decrypt_mapped(data: memoryview, password: str, output_path: str) -> None:
+    """Decrypt a mapped CloudSync file into the output path."""
+    if len(data) < HEADER_SIZE:
+        msg = "Truncated CloudSync header"
         raise ValueError(msg)
 
-    # Skip magic (17 bytes) + MD5 hash (32 bytes)
-    stream = io.BytesIO(data[49:])
-    metadata = _parse_cloudsync_stream(stream)
+    # Skip magic + MD5 hash
+    metadata = _parse_cloudsync_stream(data[HEADER_SIZE:])
 
     if metadata.enc_key1 is None or metadata.salt is None:
         msg = "Missing encryption metadata (enc_key1 or salt)"
@@ -271,16 +535,42 @@ def decrypt_cloudsync(encrypted_path: str, password: str, output_path: str) -> N
     # Stage 1: Decrypt enc_key1 to get session key
     session_key = _decrypt_session_key(metadata.enc_key1, password, metadata.salt)
 
-    # Stage 2: Decrypt data chunks
-    decrypted_data = _decrypt_chunks(metadata.encrypted_chunks, session_key)
-
-    # Decompress if needed (LZ4 frame format)
+    # Stage 2: Decrypt data chunks, decompressing as they are produced if needed
+    # (LZ4 frame format), and stream them to the output so the plaintext is
+    # never held in memory as a whole
+    chunks: Iterator[bytes | bytearray] = _decrypt_chunks(
+        metadata.encrypted_chunks,
+        session_key,
+    )
     if metadata.compress:
-        decrypted_data = lz4.frame.decompress(decrypted_data)
+        chunks = _decompress_chunks(chunks)
 
     # Verify and write output
-    _verify_md5(decrypted_data, metadata.file_md5_hash)
-    Path(output_path).write_bytes(decrypted_data)
+    _write_chunks(chunks, output_path, metadata.file_md5_hash)
+
+    # Drop the chunk views so the mapping can be closed
+    metadata.encrypted_chunks.clear()
+
+
+def decrypt_cloudsync(encrypted_path: str, password: str, output_path: str) -> None:
+    """Decrypt a Synology CloudSync encrypted file."""
+    with Path(encrypted_path).open("rb") as f:
+        # Verify magic header (this also rejects empty files, which cannot be mapped)
+        if f.read(len(MAGIC)) != MAGIC:
+            msg = "Not a CloudSync encrypted file"
+            raise ValueError(msg)
+        # Map the file rather than reading it so the parser works on zero-copy views
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = memoryview(mm)
+            try:
+                _decrypt_mapped(data, password, output_path)
+            except BaseException as exc:
+                # The failed frames still hold views into the mapping; clear them
+                # so closing it does not raise over the original error
+                traceback.clear_frames(exc.__traceback__)
+                raise
+            finally:
+                data.release()
     print(f"Decryption successful! Output: {output_path}")  # noqa: T201
 
 